@@ -1,13 +1,27 @@
 from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List, Optional
-from pydantic import BaseModel
-from datetime import datetime
+from pydantic import BaseModel, TypeAdapter
+from datetime import datetime, timezone
 import asyncio
-from telethon import TelegramClient
-from telethon.tl.types import Channel, Chat, User, MessageReactions
+import base64
+import functools
+import hashlib
+import re
+import time
+from collections import defaultdict
+from urllib.parse import urlencode
+import orjson
+import pydantic_core
+from cachetools import TTLCache
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+from telethon import TelegramClient, utils
+from telethon.tl.types import Channel, Chat, User, MessageReactions, InputPeerChannel
 from telethon.errors import SessionPasswordNeededError, FloodWaitError
+from telethon.network import ConnectionTcpFull
+from telethon.tl.functions.updates import GetStateRequest
 import os
 from dotenv import load_dotenv
 from deep_translator import GoogleTranslator
@@ -15,7 +29,7 @@ from langdetect import detect, LangDetectException
 
 load_dotenv()
 
-app = FastAPI(title="Telegram Channel API", version="1.0.0")
+app = FastAPI(title="Telegram Channel API", version="1.0.0", default_response_class=ORJSONResponse)
 
 # Add CORS middleware to allow frontend requests
 app.add_middleware(
@@ -24,6 +38,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Link"],
 )
 
 # Telegram API credentials from environment variables
@@ -34,8 +49,219 @@ SESSION_NAME = os.getenv("TELEGRAM_SESSION_NAME", "telegram_session")
 if not API_ID or not API_HASH:
     raise ValueError("TELEGRAM_API_ID and TELEGRAM_API_HASH must be set in environment variables")
 
-# Initialize Telegram client
-client = TelegramClient(SESSION_NAME, int(API_ID), API_HASH)
+# Initialize Telegram client. One long-lived connection is shared by all
+# requests; updates are neither received nor caught up on since the API only
+# reads history.
+client = TelegramClient(
+    SESSION_NAME,
+    int(API_ID),
+    API_HASH,
+    connection=ConnectionTcpFull,
+    proxy=None,
+    connection_retries=10,
+    request_retries=5,
+    auto_reconnect=True,
+    flood_sleep_threshold=30,
+    receive_updates=False,
+    catch_up=False
+)
+
+# Data centers to open extra connections to on startup (e.g. "2,4,5"). Only
+# requests served by other DCs, such as media, use them, so none by default.
+PREWARM_DCS = [int(dc) for dc in os.getenv("TELEGRAM_PREWARM_DCS", "").split(",") if dc.strip()]
+
+# MTProto library used to fetch message history: "telethon" or "pyrogram".
+# Channels are always listed through Telethon.
+MTPROTO_BACKEND = os.getenv("MTPROTO_BACKEND", "telethon")
+PYROGRAM_SESSION_NAME = os.getenv("PYROGRAM_SESSION_NAME", f"{SESSION_NAME}_pyrogram")
+
+if MTPROTO_BACKEND not in ("telethon", "pyrogram"):
+    raise ValueError("MTPROTO_BACKEND must be either 'telethon' or 'pyrogram'")
+
+# Pyrogram client, created on startup when MTPROTO_BACKEND is "pyrogram"
+pyro = None
+
+# Redis response cache (disabled when REDIS_URL is not set)
+REDIS_URL = os.getenv("REDIS_URL")
+# How long (seconds) a cached response is kept around as a stale fallback
+CACHE_STALE_TTL = int(os.getenv("CACHE_STALE_TTL", "3600"))
+# How long (seconds) a cached response is considered fresh, per policy
+CACHE_POLICIES = {"short": 10, "normal": 60, "long": 300}
+# Upstream errors for which the last cached response is served instead
+# (404 from ValueError, 429 from FloodWaitError)
+STALE_FALLBACK_STATUSES = (404, 429)
+# Response headers stored alongside cached bodies
+CACHED_HEADERS = ("link",)
+
+redis_client = None
+# Redis key prefix, scoped to the authenticated Telegram user on startup since
+# dialogs and access hashes differ between accounts
+redis_prefix = "telegrampa"
+
+async def _cache_get(key: str) -> Optional[dict]:
+    """Fetch a cached response entry, treating Redis failures as a miss"""
+    try:
+        entry = await redis_client.hgetall(key)
+    except RedisError as e:
+        print(f"Warning: Could not read cache entry {key}: {e}")
+        return None
+    return entry or None
+
+async def _cache_set(key: str, body: bytes, ttl: int, headers: dict):
+    """Store a response entry, keeping it for CACHE_STALE_TTL as a stale fallback"""
+    now = time.time()
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={
+                "body": body,
+                "headers": orjson.dumps(headers),
+                "stale_at": now + ttl,
+                "generated_at": now
+            })
+            pipe.expire(key, max(ttl, CACHE_STALE_TTL))
+            await pipe.execute()
+    except RedisError as e:
+        print(f"Warning: Could not write cache entry {key}: {e}")
+
+def _cached_response(entry: dict) -> Response:
+    """Rebuild a response from a cache entry"""
+    headers = orjson.loads(entry.get(b"headers", b"{}"))
+    return Response(content=entry[b"body"], media_type="application/json", headers=headers)
+
+# Responses currently being generated, keyed by cache key. Identical requests
+# that arrive meanwhile wait for these instead of calling Telegram again.
+_inflight = {}
+# How long (seconds) a request waits on an identical in-flight one before
+# generating the response itself
+INFLIGHT_TIMEOUT = 60
+
+class _InflightAborted(Exception):
+    """Raised to requests waiting on an in-flight response that was abandoned"""
+
+def _release(key: str, inflight: asyncio.Future, result: Optional[tuple] = None,
+             error: Optional[BaseException] = None):
+    """Stop tracking an in-flight response, handing its result or error to waiting requests"""
+    if _inflight.get(key) is inflight:
+        del _inflight[key]
+    if inflight.done():
+        return
+    if error is not None:
+        inflight.set_exception(error)
+        # Mark the error as retrieved in case no requests were waiting
+        inflight.exception()
+    else:
+        inflight.set_result(result)
+
+async def _share_stream(key: str, inflight: asyncio.Future, chunks, ttl: int, headers: dict):
+    """Pass a streamed response body through, then share and cache the full body"""
+    body = []
+    try:
+        async for chunk in chunks:
+            body.append(chunk)
+            yield chunk
+    except BaseException:
+        _release(key, inflight, error=_InflightAborted())
+        raise
+    body = b"".join(body)
+    _release(key, inflight, result=(body, headers))
+    if redis_client is not None:
+        await _cache_set(key, body, ttl, headers)
+
+class _InflightStreamingResponse(StreamingResponse):
+    """
+    Streaming response that releases its in-flight entry however the response
+    ends, including when it is cut off before the body is iterated
+    """
+
+    def __init__(self, response: StreamingResponse, key: str, inflight: asyncio.Future, body_iterator):
+        super().__init__(body_iterator, status_code=response.status_code, background=response.background)
+        self.raw_headers = response.raw_headers
+        self.key = key
+        self.inflight = inflight
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # No-op if the body completed and already shared its result
+            _release(self.key, self.inflight, error=_InflightAborted())
+
+async def _generate_response(key: str, ttl: int, func, kwargs: dict):
+    """Call an endpoint, sharing its response with identical requests that arrive meanwhile"""
+    inflight = asyncio.get_running_loop().create_future()
+    _inflight[key] = inflight
+    try:
+        result = await func(**kwargs)
+    except Exception as e:
+        _release(key, inflight, error=e)
+        raise
+    except BaseException:
+        _release(key, inflight, error=_InflightAborted())
+        raise
+
+    headers = {}
+    if isinstance(result, Response):
+        headers = {name: result.headers[name] for name in CACHED_HEADERS if name in result.headers}
+
+    if isinstance(result, StreamingResponse):
+        body_iterator = _share_stream(key, inflight, result.body_iterator, ttl, headers)
+        return _InflightStreamingResponse(result, key, inflight, body_iterator)
+
+    if isinstance(result, Response):
+        body = result.body
+    else:
+        body = pydantic_core.to_json(result)
+    _release(key, inflight, result=(body, headers))
+    if redis_client is not None:
+        await _cache_set(key, body, ttl, headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def cache(policy: str = "normal", normalize: Optional[dict] = None):
+    """
+    Cache an endpoint's JSON response in Redis.
+    The cache key is derived from the endpoint name and its parameters. Fresh
+    entries are served without calling the endpoint; if the endpoint fails with
+    one of STALE_FALLBACK_STATUSES, the last cached response is served instead.
+    Concurrent identical requests share a single call to the endpoint, with or
+    without Redis. `normalize` maps parameter names to functions applied before
+    the key is built, so equivalent requests share an entry.
+    """
+    ttl = CACHE_POLICIES[policy]
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(**kwargs):
+            for name, normalize_param in (normalize or {}).items():
+                kwargs[name] = normalize_param(kwargs[name])
+            args = ",".join(f"{name}={kwargs[name]}" for name in sorted(kwargs))
+            key = f"{redis_prefix}:cache:" + hashlib.sha1(f"{func.__name__}:{args}".encode()).hexdigest()
+
+            entry = None
+            if redis_client is not None:
+                entry = await _cache_get(key)
+                if entry and float(entry[b"stale_at"]) > time.time():
+                    return _cached_response(entry)
+
+            try:
+                failed = None
+                while True:
+                    inflight = _inflight.get(key)
+                    if inflight is None or inflight is failed:
+                        return await _generate_response(key, ttl, func, kwargs)
+                    try:
+                        body, headers = await asyncio.wait_for(asyncio.shield(inflight), INFLIGHT_TIMEOUT)
+                        return Response(content=body, media_type="application/json", headers=headers)
+                    except (_InflightAborted, asyncio.TimeoutError):
+                        # The request generating it went away or stalled. Wait on
+                        # a replacement if another request already started one,
+                        # otherwise generate the response here.
+                        failed = inflight
+            except HTTPException as e:
+                if entry and e.status_code in STALE_FALLBACK_STATUSES:
+                    return _cached_response(entry)
+                raise
+        return wrapper
+    return decorator
 
 # Helper function to extract reactions from a message
 def extract_reactions(message) -> Optional[List]:
@@ -62,10 +288,7 @@ def extract_reactions(message) -> Optional[List]:
                             emoji_str = str(reaction.reaction)
                     
                     if emoji_str and hasattr(reaction, 'count'):
-                        reactions_list.append(ReactionModel(
-                            emoji=emoji_str,
-                            count=reaction.count
-                        ))
+                        reactions_list.append({"emoji": emoji_str, "count": reaction.count})
         
         return reactions_list if reactions_list else None
     except Exception as e:
@@ -73,7 +296,403 @@ def extract_reactions(message) -> Optional[List]:
         print(f"Warning: Could not extract reactions for message {message.id}: {e}")
         return None
 
+def _serialize_message(message, translate: bool, senders: dict) -> dict:
+    """Convert a Telegram message to a MessageModel-shaped dict"""
+    # Extract sender information
+    sender_id = None
+    sender_username = None
+    sender = senders.get(message.sender_id)
+    if isinstance(sender, (User, Channel)):
+        sender_id = sender.id
+        sender_username = sender.username
+    
+    # Get message text
+    text = message.message or ""
+    if message.media and not text:
+        text = f"[Media: {type(message.media).__name__}]"
+    
+    # Translate Russian to English if translate is enabled
+    if translate:
+        text = translate_russian_to_english(text)
+    
+    return {
+        "id": message.id,
+        "date": message.date,
+        "text": text,
+        "sender_id": sender_id,
+        "sender_username": sender_username,
+        "views": message.views,
+        "forwards": message.forwards,
+        "reactions": extract_reactions(message)
+    }
+
+# Telegram returns at most this many messages per history request
+MESSAGES_PAGE_SIZE = 100
+# Maximum number of history requests in flight at once; kept low since
+# Telegram answers bursts of requests with flood waits
+FETCH_CONCURRENCY = 4
+_fetch_semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+async def _fetch_window(entity, min_id: int, max_id: int):
+    """Fetch the messages with IDs strictly between min_id and max_id"""
+    async with _fetch_semaphore:
+        return await client.get_messages(
+            entity, limit=MESSAGES_PAGE_SIZE, min_id=min_id, max_id=max_id
+        )
+
+async def _fetch_pages(entity, limit: int, offset_id: Optional[int] = None,
+                       min_id: Optional[int] = None, max_id: Optional[int] = None,
+                       add_offset: int = 0):
+    """
+    Fetch up to `limit` messages, newest first, with one get_messages() call per
+    page. Yields each page as a list of messages. `add_offset` skips that many
+    messages below the offset before the first one returned.
+
+    When more than one page is needed, the ID range below the newest message is
+    split into page-sized windows that are fetched concurrently. Gaps left by
+    deleted messages can make the windows come up short, in which case the
+    remaining messages are paged in sequentially below the last window.
+    """
+    offset_id = offset_id or 0
+    min_id = min_id or 0
+    max_id = max_id or 0
+
+    if limit > MESSAGES_PAGE_SIZE:
+        newest = await client.get_messages(
+            entity, limit=1, offset_id=offset_id, min_id=min_id, max_id=max_id, add_offset=add_offset
+        )
+        if not newest:
+            return
+
+        # Windows cover IDs strictly between `low` and `high`, counting down
+        windows = []
+        high = newest[0].id + 1
+        while len(windows) * MESSAGES_PAGE_SIZE < limit and high - 1 > min_id:
+            low = max(high - MESSAGES_PAGE_SIZE - 1, min_id)
+            windows.append(asyncio.create_task(_fetch_window(entity, low, high)))
+            high = low + 1
+
+        try:
+            for window in windows:
+                page = (await window)[:limit]
+                if page:
+                    yield page
+                    limit -= len(page)
+        finally:
+            for window in windows:
+                window.cancel()
+
+        # Carry on below the last window
+        offset_id = high
+        max_id = 0
+        add_offset = 0
+        if high - 1 <= min_id:
+            return
+
+    while limit > 0:
+        page_size = min(limit, MESSAGES_PAGE_SIZE)
+        page = await client.get_messages(
+            entity, limit=page_size, offset_id=offset_id, min_id=min_id, max_id=max_id, add_offset=add_offset
+        )
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        limit -= len(page)
+        # Continue below the oldest message; the offset now bounds the range
+        offset_id = page[-1].id
+        max_id = 0
+        add_offset = 0
+
+# Window (ms) in which message requests for the same channel are merged into a
+# single fetch; 0 disables batching
+MICROBATCH_MS = int(os.getenv("MICROBATCH_MS", "0"))
+# Most messages a merged fetch retrieves
+MICROBATCH_MAX_LIMIT = 1000
+_batch_queues = {}
+_batch_tasks = set()
+
+async def _batcher(key: int, entity, queue: asyncio.Queue):
+    """
+    Collect message requests for a channel for MICROBATCH_MS, then fetch the
+    union of their ranges once and hand each request its slice. Requests the
+    merged fetch didn't reach far enough for get None and fetch on their own.
+    """
+    await asyncio.sleep(MICROBATCH_MS / 1000)
+    # Requests arriving from now on start a new batch
+    del _batch_queues[key]
+    requests = []
+    while not queue.empty():
+        requests.append(queue.get_nowait())
+
+    # Bounds are exclusive; an upper bound of 0 means no bound
+    low = min(min_id for _, min_id, _, _ in requests)
+    high = 0 if any(not max_id for _, _, max_id, _ in requests) else max(max_id for _, _, max_id, _ in requests)
+    total = min(sum(limit for limit, _, _, _ in requests), MICROBATCH_MAX_LIMIT)
+    try:
+        messages = [message async for page in _fetch_pages(entity, total, min_id=low, max_id=high) for message in page]
+    except Exception as e:
+        for _, _, _, future in requests:
+            if not future.done():
+                future.set_exception(e)
+        return
+
+    # The merged fetch holds every message in the union down to its oldest one
+    exhausted = len(messages) < total
+    oldest = messages[-1].id if messages else 0
+    for limit, min_id, max_id, future in requests:
+        if future.done():
+            continue
+        page = [message for message in messages if message.id > min_id and (not max_id or message.id < max_id)][:limit]
+        if len(page) == limit or exhausted or oldest <= min_id + 1:
+            future.set_result(page)
+        else:
+            future.set_result(None)
+
+async def _fetch_batched(entity, limit: int, offset_id: Optional[int] = None,
+                         min_id: Optional[int] = None, max_id: Optional[int] = None):
+    """
+    Fetch messages like _fetch_pages(), merged with other requests for the same
+    channel that arrive within MICROBATCH_MS. Yields the messages as one page.
+    """
+    key = utils.get_peer_id(entity)
+    queue = _batch_queues.get(key)
+    if queue is None:
+        queue = _batch_queues[key] = asyncio.Queue()
+        task = asyncio.create_task(_batcher(key, entity, queue))
+        _batch_tasks.add(task)
+        task.add_done_callback(_batch_tasks.discard)
+
+    future = asyncio.get_running_loop().create_future()
+    # Like Telethon, treat the larger of offset_id and max_id as the upper bound
+    queue.put_nowait((limit, min_id or 0, max(offset_id or 0, max_id or 0), future))
+    page = await future
+
+    if page is None:
+        async for page in _fetch_pages(entity, limit, offset_id, min_id, max_id):
+            yield page
+    elif page:
+        yield page
+
+async def _prefetch(pages):
+    """
+    Fetch the first page of messages so Telegram errors are raised before the
+    response starts. Returns the first page (None if there are no messages)
+    and an iterator over all pages.
+    """
+    try:
+        first = await pages.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    async def prefetched():
+        if first is None:
+            return
+        yield first
+        async for page in pages:
+            yield page
+    return first, prefetched()
+
+async def _resolve_senders(page) -> dict:
+    """
+    Map the sender IDs in a page of messages to their entities.
+    Senders included in the history response are already attached to their
+    messages; any that aren't are fetched together in one get_entity() call.
+    """
+    senders = {}
+    missing = set()
+    for message in page:
+        if message.sender is not None:
+            senders[message.sender_id] = message.sender
+        elif message.sender_id is not None:
+            missing.add(message.sender_id)
+    missing -= senders.keys()
+
+    if missing:
+        try:
+            for entity in await client.get_entity(list(missing)):
+                senders[utils.get_peer_id(entity)] = entity
+        except ValueError as e:
+            # Leave unresolvable senders empty, as if they weren't sent at all
+            print(f"Warning: Could not resolve senders {sorted(missing)}: {e}")
+    return senders
+
+async def _serialize_page(page, translate: bool) -> List[dict]:
+    """Serialize a page of Telethon messages"""
+    senders = await _resolve_senders(page)
+    return [_serialize_message(message, translate, senders) for message in page]
+
+async def _stream_messages(pages, serialize_page):
+    """Encode pages of messages as a single JSON array, one page at a time"""
+    yield b"["
+    first = True
+    async for page in pages:
+        # Encode the page as an array and strip its brackets; OPT_UTC_Z keeps
+        # dates as "...Z" like the pydantic-encoded responses did
+        chunk = orjson.dumps(await serialize_page(page), option=orjson.OPT_UTC_Z)[1:-1]
+        yield chunk if first else b"," + chunk
+        first = False
+    yield b"]"
+
+# Pyrogram backend
+async def _fetch_pyrogram_pages(chat, limit: int, offset_id: Optional[int] = None,
+                                min_id: Optional[int] = None, max_id: Optional[int] = None,
+                                add_offset: int = 0):
+    """
+    Fetch up to `limit` messages with Pyrogram, newest first, yielding them in
+    pages. Pyrogram errors are raised as their Telethon equivalents so the
+    endpoints handle both backends the same way.
+    """
+    from pyrogram.errors import BadRequest, FloodWait
+
+    # get_chat_history has no min_id/max_id; like Telethon, start below the
+    # larger of offset_id and max_id and stop once min_id is reached
+    offset_id = max(offset_id or 0, max_id or 0)
+    page = []
+    try:
+        if add_offset:
+            # get_chat_history applies `offset` to every chunk it requests, so
+            # use it only to find the first message and continue from its ID
+            async for message in pyro.get_chat_history(chat, limit=1, offset=add_offset, offset_id=offset_id):
+                offset_id = message.id + 1
+                break
+            else:
+                return
+        async for message in pyro.get_chat_history(chat, limit=limit, offset_id=offset_id):
+            if min_id and message.id <= min_id:
+                break
+            page.append(message)
+            if len(page) == MESSAGES_PAGE_SIZE:
+                yield page
+                page = []
+    except FloodWait as e:
+        raise FloodWaitError(request=None, capture=e.value)
+    except BadRequest as e:
+        raise ValueError(str(e))
+    if page:
+        yield page
+
+def _serialize_pyrogram_message(message, translate: bool) -> dict:
+    """Convert a Pyrogram message to a MessageModel-shaped dict"""
+    sender = message.from_user or message.sender_chat
+    
+    text = message.text or message.caption or ""
+    if message.media and not text:
+        text = f"[Media: {message.media.name.title()}]"
+    
+    if translate:
+        text = translate_russian_to_english(text)
+    
+    reactions = None
+    if message.reactions and message.reactions.reactions:
+        reactions = [
+            {"emoji": reaction.emoji or f"🎨{reaction.custom_emoji_id}", "count": reaction.count}
+            for reaction in message.reactions.reactions
+        ]
+    
+    return {
+        "id": message.id,
+        # Pyrogram returns naive local times; report UTC like Telethon
+        "date": message.date.astimezone(timezone.utc),
+        "text": text,
+        # Pyrogram marks channel IDs with -100; report them bare like Telethon
+        "sender_id": utils.resolve_id(sender.id)[0] if sender else None,
+        "sender_username": sender.username if sender else None,
+        "views": message.views,
+        "forwards": message.forwards,
+        "reactions": reactions
+    }
+
+async def _serialize_pyrogram_page(page, translate: bool) -> List[dict]:
+    """Serialize a page of Pyrogram messages"""
+    return [_serialize_pyrogram_message(message, translate) for message in page]
+
+def _encode_cursor(channel_id: int, access_hash: int, offset_id: int, add_offset: int) -> str:
+    """Encode a pagination cursor"""
+    return base64.urlsafe_b64encode(orjson.dumps({
+        "c": channel_id, "h": access_hash, "o": offset_id, "a": add_offset
+    })).decode()
+
+def _decode_cursor(cursor: str) -> tuple:
+    """
+    Decode a pagination cursor into (channel_id, access_hash, offset_id, add_offset),
+    raising a 400 error if it is malformed
+    """
+    try:
+        data = orjson.loads(base64.urlsafe_b64decode(cursor))
+        return int(data["c"]), int(data["h"]), int(data["o"]), int(data["a"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def _message_response(key, limit: int, offset_id: Optional[int], min_id: Optional[int],
+                            max_id: Optional[int], translate: bool,
+                            cursor: Optional[tuple] = None) -> StreamingResponse:
+    """
+    Stream messages from a channel, identified by ID or username, using the
+    configured MTProto backend.
+
+    A decoded cursor replaces the channel key, offset_id and max_id. When more
+    messages may follow, a cursor for the next page is returned in a Link
+    header. It is anchored on the newest message returned and skips this
+    page's messages, so it can be issued before the body is streamed.
+    """
+    access_hash = None
+    add_offset = 0
+    if cursor is not None:
+        key, access_hash, offset_id, add_offset = cursor
+        max_id = None
+
+    # A cursor carries the access hash, so the channel needn't be resolved
+    if cursor is not None:
+        entity = InputPeerChannel(channel_id=key, access_hash=access_hash)
+    else:
+        entity = await resolve_entity(key)
+    peer = utils.get_input_peer(entity)
+
+    if pyro is not None:
+        chat = key
+        if isinstance(peer, InputPeerChannel):
+            # Hand Pyrogram the access hash Telethon already knows, since its own
+            # session has never seen the channel; it addresses channels by
+            # their -100 marked ID
+            chat = utils.get_peer_id(peer)
+            await pyro.storage.update_peers([(chat, peer.access_hash, "channel", None, None)])
+        pages = _fetch_pyrogram_pages(chat, limit, offset_id, min_id, max_id, add_offset)
+        serialize_page = functools.partial(_serialize_pyrogram_page, translate=translate)
+    else:
+        if MICROBATCH_MS > 0 and not add_offset:
+            pages = _fetch_batched(entity, limit, offset_id, min_id, max_id)
+        else:
+            pages = _fetch_pages(entity, limit, offset_id, min_id, max_id, add_offset)
+        serialize_page = functools.partial(_serialize_page, translate=translate)
+
+    first, pages = await _prefetch(pages)
+    response = StreamingResponse(_stream_messages(pages, serialize_page), media_type="application/json")
+
+    # A short single page means there is nothing left to fetch
+    if first is None or (limit <= MESSAGES_PAGE_SIZE and len(first) < limit):
+        return response
+    if not isinstance(peer, InputPeerChannel):
+        return response
+
+    params = {
+        "cursor": _encode_cursor(peer.channel_id, peer.access_hash, first[0].id + 1, limit),
+        "limit": limit,
+        "translate": str(translate).lower()
+    }
+    if min_id is not None:
+        params["min_id"] = min_id
+    response.headers["Link"] = f'<?{urlencode(params)}>; rel="next"'
+    return response
+
 # Translation function
+# Text without Cyrillic characters can't be Russian, so it skips detection
+CYRILLIC_PATTERN = re.compile('[\u0400-\u04FF]')
+# Translations are cached since polling clients fetch the same messages repeatedly
+_translation_cache = TTLCache(maxsize=4096, ttl=86400)
+_translator = GoogleTranslator(source='ru', target='en')
+
 def translate_russian_to_english(text: str) -> str:
     """
     Detects if text is in Russian and translates it to English.
@@ -82,30 +701,94 @@ def translate_russian_to_english(text: str) -> str:
     if not text or len(text.strip()) == 0:
         return text
     
+    if not CYRILLIC_PATTERN.search(text):
+        return text
+    
+    translated = _translation_cache.get(text)
+    if translated is not None:
+        return translated
+    
     try:
         # Detect language
         detected_lang = detect(text)
         
         # If Russian detected, translate to English
         if detected_lang == 'ru':
-            translator = GoogleTranslator(source='ru', target='en')
-            translated = translator.translate(text)
-            return translated
+            translated = _translator.translate(text)
         else:
-            return text
+            translated = text
     except LangDetectException:
-        # If language detection fails, try to translate anyway if it looks like Russian
-        # (contains Cyrillic characters)
-        if any('\u0400' <= char <= '\u04FF' for char in text):
-            try:
-                translator = GoogleTranslator(source='ru', target='en')
-                translated = translator.translate(text)
-                return translated
-            except Exception:
-                return text
+        # If language detection fails, try to translate anyway since the text
+        # contains Cyrillic characters
+        try:
+            translated = _translator.translate(text)
+        except Exception:
+            return text
     except Exception:
-        # If translation fails, return original text
+        # If translation fails, return original text without caching it
         return text
+    
+    _translation_cache[text] = translated
+    return translated
+
+# Entity resolution, cached in-process and in Redis
+ENTITY_CACHE_TTL = 3600
+_entity_cache = TTLCache(maxsize=4096, ttl=ENTITY_CACHE_TTL)
+# One lock per channel ID or username, kept so every lookup of a key shares it
+_entity_locks = defaultdict(asyncio.Lock)
+
+async def _load_entity(key) -> Optional[InputPeerChannel]:
+    """Rebuild a channel's input peer from the ID and access hash stored in Redis"""
+    if redis_client is None:
+        return None
+    try:
+        stored = await redis_client.hgetall(f"{redis_prefix}:entity:{key}")
+    except RedisError as e:
+        print(f"Warning: Could not read entity {key} from cache: {e}")
+        return None
+    if not stored:
+        return None
+    return InputPeerChannel(channel_id=int(stored[b"id"]), access_hash=int(stored[b"access_hash"]))
+
+async def _store_entities(entities: dict):
+    """Store the ID and access hash of each channel in Redis, keyed by lookup key"""
+    channels = {key: entity for key, entity in entities.items() if isinstance(entity, Channel)}
+    if redis_client is None or not channels:
+        return
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            for key, entity in channels.items():
+                pipe.hset(f"{redis_prefix}:entity:{key}", mapping={
+                    "id": entity.id,
+                    "access_hash": entity.access_hash
+                })
+                pipe.expire(f"{redis_prefix}:entity:{key}", ENTITY_CACHE_TTL)
+            await pipe.execute()
+    except RedisError as e:
+        print(f"Warning: Could not write entities to cache: {e}")
+
+async def resolve_entity(key):
+    """
+    Resolve a channel ID or username to an entity.
+    Checks the in-process cache, then Redis, then asks Telegram. Concurrent
+    lookups of the same key wait for a single Telegram request.
+    """
+    if isinstance(key, str):
+        key = key.lower()
+
+    entity = _entity_cache.get(key)
+    if entity is not None:
+        return entity
+
+    async with _entity_locks[key]:
+        entity = _entity_cache.get(key)
+        if entity is None:
+            entity = await _load_entity(key)
+        if entity is None:
+            entity = await client.get_entity(key)
+            await _store_entities({key: entity})
+        _entity_cache[key] = entity
+    return entity
 
 # Response models
 class ReactionModel(BaseModel):
@@ -128,17 +811,47 @@ class ChannelModel(BaseModel):
     username: Optional[str] = None
     participants_count: Optional[int] = None
 
+# Built once and reused to encode /channels responses
+channel_list_adapter = TypeAdapter(List[ChannelModel])
+
 @app.on_event("startup")
 async def startup_event():
-    """Initialize Telegram client on startup"""
-    await client.start()
+    """Initialize Telegram clients and Redis cache on startup"""
+    global redis_client, redis_prefix, pyro
+    await client.connect()
     if not await client.is_user_authorized():
         raise RuntimeError("Telegram client is not authorized. Please run setup script first.")
+    # Warm up the connection so the first request doesn't pay for it
+    await client(GetStateRequest())
+    # Open connections to other DCs ahead of time; Telethon disconnects them
+    # again once they have been idle for a while
+    for dc_id in PREWARM_DCS:
+        if dc_id == client.session.dc_id:
+            continue
+        try:
+            sender = await client._borrow_exported_sender(dc_id)
+            await client._return_exported_sender(sender)
+        except Exception as e:
+            print(f"Warning: Could not open connection to DC {dc_id}: {e}")
+    if REDIS_URL:
+        me = await client.get_me()
+        redis_prefix = f"telegrampa:{me.id}"
+        redis_client = aioredis.from_url(REDIS_URL)
+    if MTPROTO_BACKEND == "pyrogram":
+        import pyrogram
+        pyro = pyrogram.Client(PYROGRAM_SESSION_NAME, api_id=int(API_ID), api_hash=API_HASH, no_updates=True)
+        if not await pyro.connect():
+            raise RuntimeError("Pyrogram client is not authorized. Please run setup script first.")
+        await pyro.initialize()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    """Disconnect Telegram client on shutdown"""
+    """Disconnect Telegram clients and Redis cache on shutdown"""
     await client.disconnect()
+    if pyro is not None:
+        await pyro.stop()
+    if redis_client is not None:
+        await redis_client.aclose()
 
 @app.get("/")
 async def root():
@@ -151,34 +864,55 @@ async def health():
     return {"status": "healthy", "connected": client.is_connected()}
 
 @app.get("/channels", response_model=List[ChannelModel])
+@cache(policy="long")
 async def list_channels():
     """
     List all channels/dialogs the user has access to
     """
     try:
-        channels = []
-        async for dialog in client.iter_dialogs():
-            entity = dialog.entity
-            if isinstance(entity, Channel):
-                channel_info = ChannelModel(
-                    id=entity.id,
-                    title=entity.title,
-                    username=entity.username,
-                    participants_count=entity.participants_count if hasattr(entity, 'participants_count') else None
-                )
-                channels.append(channel_info)
-        return channels
+        # Fetch all dialogs in one call rather than iterating them batch by batch
+        dialogs = await client.get_dialogs(limit=None)
+
+        # Filter channels once with an exact type check (Telethon's Channel has
+        # no subclasses)
+        channel_entities = [dialog.entity for dialog in dialogs if dialog.entity.__class__ is Channel]
+
+        # Remember each channel so message requests can skip resolving it
+        entities = {}
+        for entity in channel_entities:
+            entities[entity.id] = entity
+            if entity.username:
+                entities[entity.username.lower()] = entity
+        _entity_cache.update(entities)
+        await _store_entities(entities)
+
+        channels = [
+            ChannelModel(
+                id=entity.id,
+                title=entity.title,
+                username=entity.username,
+                participants_count=getattr(entity, 'participants_count', None)
+            )
+            for entity in channel_entities
+        ]
+        # Encode directly; FastAPI would otherwise validate the models again
+        return Response(content=channel_list_adapter.dump_json(channels), media_type="application/json")
+    except FloodWaitError as e:
+        raise HTTPException(status_code=429, detail=f"Rate limited. Wait {e.seconds} seconds")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing channels: {str(e)}")
 
-@app.get("/channels/{channel_id}/messages", response_model=List[MessageModel])
+# The body is streamed as pre-encoded JSON; the model only documents its shape
+@app.get("/channels/{channel_id}/messages", responses={200: {"model": List[MessageModel]}})
+@cache(policy="short")
 async def get_messages(
     channel_id: int,
     limit: int = Query(default=50, ge=1, le=1000, description="Number of messages to retrieve"),
     offset_id: Optional[int] = Query(default=None, description="Offset message ID for pagination"),
     min_id: Optional[int] = Query(default=None, description="Minimum message ID to retrieve"),
     max_id: Optional[int] = Query(default=None, description="Maximum message ID to retrieve"),
-    translate: bool = Query(default=True, description="Automatically translate Russian messages to English")
+    translate: bool = Query(default=True, description="Automatically translate Russian messages to English"),
+    cursor: Optional[str] = Query(default=None, description="Pagination cursor from a previous response's Link header")
 ):
     """
     Get messages from a specific channel
@@ -188,58 +922,14 @@ async def get_messages(
     - **offset_id**: Message ID to start from (for pagination)
     - **min_id**: Minimum message ID to retrieve
     - **max_id**: Maximum message ID to retrieve
+    - **cursor**: Cursor for the next page, taken from the `Link` header (replaces offset_id and max_id)
     """
+    if cursor is not None:
+        cursor = _decode_cursor(cursor)
+        if cursor[0] != channel_id:
+            raise HTTPException(status_code=400, detail="Cursor belongs to a different channel")
     try:
-        # Get the channel entity
-        entity = await client.get_entity(channel_id)
-        
-        # Build kwargs for iter_messages, only including non-None values
-        iter_kwargs = {"limit": limit}
-        if offset_id is not None:
-            iter_kwargs["offset_id"] = offset_id
-        if min_id is not None:
-            iter_kwargs["min_id"] = min_id
-        if max_id is not None:
-            iter_kwargs["max_id"] = max_id
-        
-        messages = []
-        async for message in client.iter_messages(entity, **iter_kwargs):
-            # Extract sender information
-            sender_id = None
-            sender_username = None
-            if message.sender:
-                if isinstance(message.sender, User):
-                    sender_id = message.sender.id
-                    sender_username = message.sender.username
-                elif isinstance(message.sender, Channel):
-                    sender_id = message.sender.id
-                    sender_username = message.sender.username
-            
-            # Get message text
-            text = message.message or ""
-            if message.media and not text:
-                text = f"[Media: {type(message.media).__name__}]"
-            
-            # Translate Russian to English if translate is enabled
-            if translate:
-                text = translate_russian_to_english(text)
-            
-            # Extract reactions
-            reactions = extract_reactions(message)
-            
-            message_model = MessageModel(
-                id=message.id,
-                date=message.date,
-                text=text,
-                sender_id=sender_id,
-                sender_username=sender_username,
-                views=message.views,
-                forwards=message.forwards,
-                reactions=reactions
-            )
-            messages.append(message_model)
-        
-        return messages
+        return await _message_response(channel_id, limit, offset_id, min_id, max_id, translate, cursor)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=f"Channel not found: {str(e)}")
     except FloodWaitError as e:
@@ -247,14 +937,17 @@ async def get_messages(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving messages: {str(e)}")
 
-@app.get("/channels/by-username/{username}/messages", response_model=List[MessageModel])
+# The body is streamed as pre-encoded JSON; the model only documents its shape
+@app.get("/channels/by-username/{username}/messages", responses={200: {"model": List[MessageModel]}})
+@cache(policy="short", normalize={"username": str.lower})
 async def get_messages_by_username(
     username: str,
     limit: int = Query(default=50, ge=1, le=1000, description="Number of messages to retrieve"),
     offset_id: Optional[int] = Query(default=None, description="Offset message ID for pagination"),
     min_id: Optional[int] = Query(default=None, description="Minimum message ID to retrieve"),
     max_id: Optional[int] = Query(default=None, description="Maximum message ID to retrieve"),
-    translate: bool = Query(default=True, description="Automatically translate Russian messages to English")
+    translate: bool = Query(default=True, description="Automatically translate Russian messages to English"),
+    cursor: Optional[str] = Query(default=None, description="Pagination cursor from a previous response's Link header")
 ):
     """
     Get messages from a channel by username (e.g., 'channelname' without @)
@@ -264,58 +957,18 @@ async def get_messages_by_username(
     - **offset_id**: Message ID to start from (for pagination)
     - **min_id**: Minimum message ID to retrieve
     - **max_id**: Maximum message ID to retrieve
+    - **cursor**: Cursor for the next page, taken from the `Link` header (replaces offset_id and max_id)
     """
+    if cursor is not None:
+        cursor = _decode_cursor(cursor)
     try:
-        # Get the channel entity by username
-        entity = await client.get_entity(username)
-        
-        # Build kwargs for iter_messages, only including non-None values
-        iter_kwargs = {"limit": limit}
-        if offset_id is not None:
-            iter_kwargs["offset_id"] = offset_id
-        if min_id is not None:
-            iter_kwargs["min_id"] = min_id
-        if max_id is not None:
-            iter_kwargs["max_id"] = max_id
-        
-        messages = []
-        async for message in client.iter_messages(entity, **iter_kwargs):
-            # Extract sender information
-            sender_id = None
-            sender_username = None
-            if message.sender:
-                if isinstance(message.sender, User):
-                    sender_id = message.sender.id
-                    sender_username = message.sender.username
-                elif isinstance(message.sender, Channel):
-                    sender_id = message.sender.id
-                    sender_username = message.sender.username
-            
-            # Get message text
-            text = message.message or ""
-            if message.media and not text:
-                text = f"[Media: {type(message.media).__name__}]"
-            
-            # Translate Russian to English if translate is enabled
-            if translate:
-                text = translate_russian_to_english(text)
-            
-            # Extract reactions
-            reactions = extract_reactions(message)
-            
-            message_model = MessageModel(
-                id=message.id,
-                date=message.date,
-                text=text,
-                sender_id=sender_id,
-                sender_username=sender_username,
-                views=message.views,
-                forwards=message.forwards,
-                reactions=reactions
-            )
-            messages.append(message_model)
-        
-        return messages
+        if cursor is not None:
+            peer = utils.get_input_peer(await resolve_entity(username))
+            if not isinstance(peer, InputPeerChannel) or peer.channel_id != cursor[0]:
+                raise HTTPException(status_code=400, detail="Cursor belongs to a different channel")
+        return await _message_response(username, limit, offset_id, min_id, max_id, translate, cursor)
+    except HTTPException:
+        raise
     except ValueError as e:
         raise HTTPException(status_code=404, detail=f"Channel not found: {str(e)}")
     except FloodWaitError as e:
@@ -324,6 +977,9 @@ async def get_messages_by_username(
         raise HTTPException(status_code=500, detail=f"Error retrieving messages: {str(e)}")
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # uvloop isn't available on Windows
+    loop = "asyncio" if sys.platform == "win32" else "uvloop"
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop=loop, http="httptools", log_level="warning")
 
@@ -14,6 +14,8 @@ API_ID = os.getenv("TELEGRAM_API_ID")
 API_HASH = os.getenv("TELEGRAM_API_HASH")
 SESSION_NAME = os.getenv("TELEGRAM_SESSION_NAME", "telegram_session")
 PHONE = os.getenv("TELEGRAM_PHONE")
+MTPROTO_BACKEND = os.getenv("MTPROTO_BACKEND", "telethon")
+PYROGRAM_SESSION_NAME = os.getenv("PYROGRAM_SESSION_NAME", f"{SESSION_NAME}_pyrogram")
 
 if not API_ID or not API_HASH:
     print("Error: TELEGRAM_API_ID and TELEGRAM_API_HASH must be set in .env file")
@@ -50,6 +52,16 @@ async def main():
         print(f"Logged in as: {me.first_name} {me.last_name or ''} (@{me.username or 'no username'})")
     
     await client.disconnect()
+    
+    if MTPROTO_BACKEND == "pyrogram":
+        # Pyrogram keeps its own session and prompts for any missing details
+        from pyrogram import Client
+        
+        print("Authorizing Pyrogram session...")
+        async with Client(PYROGRAM_SESSION_NAME, api_id=int(API_ID), api_hash=API_HASH, phone_number=PHONE) as pyro:
+            me = await pyro.get_me()
+            print(f"Pyrogram logged in as: {me.first_name} {me.last_name or ''} (@{me.username or 'no username'})")
+    
     print("Setup complete! You can now run the API server.")
 
 if __name__ == "__main__":